@@ -0,0 +1,72 @@
+"""
+Compares construction time and allocations of the pydantic models against the
+slotted record types for rows read from the event, user and check_in tables.
+
+Run from the project root: python benchmarks/bench_records.py
+"""
+
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from models import CheckIn, CheckInRecord, Event, EventRecord, User, UserRecord
+
+EVENT_ROW = (
+    12345678,
+    "confirmed",
+    "https://app.punchpass.com/a/instances/12345678",
+    "1970-01-01T00:00:00+00:00",
+    "1970-01-01T00:00:00+00:00",
+    "Vinyasa Flow",
+    "Studio A",
+    "Jane Doe",
+    "1970-01-01T12:00:00+00:00",
+    "1970-01-01T13:00:00+00:00",
+    12433,
+)
+USER_ROW = (12345678, "John", "Doe", "1234567890", "johndoe@example.com", 12433)
+CHECK_IN_ROW = (
+    "123e4567-e89b-12d3-a456-426614174000",
+    12345678,
+    12345678,
+    "pending",
+    "1970-01-01T00:00:00+00:00",
+    "1970-01-01T00:00:00+00:00",
+    12433,
+)
+ROWS = 10_000
+
+
+def _allocated(build, row) -> int:
+    tracemalloc.start()
+    objects = [build(row) for _ in range(ROWS)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return size // ROWS
+
+
+def _report(label: str, model, record, row: tuple) -> None:
+    fields = list(model.model_fields)
+
+    def build_model(row):
+        return model(**dict(zip(fields, row)))
+
+    def build_record(row):
+        return record(*row)
+
+    for kind, build in (("pydantic", build_model), ("record", build_record)):
+        seconds = timeit.timeit(lambda: build(row), number=ROWS)
+        print(
+            f"{label:<8} {kind:<9} {seconds / ROWS * 1e6:8.2f} us/row "
+            f"{_allocated(build, row):6d} B/row"
+        )
+
+
+if __name__ == "__main__":
+    _report("Event", Event, EventRecord, EVENT_ROW)
+    _report("User", User, UserRecord, USER_ROW)
+    _report("CheckIn", CheckIn, CheckInRecord, CHECK_IN_ROW)
@@ -0,0 +1,53 @@
+"""
+Compares ETL extract and transform wall time, request count and bytes
+transferred over HTTP/1.1 and HTTP/2 against the live upstream.
+
+Needs EMAIL and PASSWORD (and optionally COMPANY_IDS) in the environment.
+Run from the project root: python benchmarks/bench_upstream.py
+"""
+
+import concurrent.futures
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import scraper
+from db.fetch_parse_insert_events import (
+    ETL_WORKERS,
+    extract_schedule,
+    transform_schedule,
+)
+from dependencies import DEFAULT_COMPANY_ID
+from scraper import Scraper
+
+
+def run(http2: bool, company_id: int) -> None:
+    scraper.UPSTREAM_HTTP2 = http2
+    Scraper._instances.clear()
+    upstream = Scraper(company_id)
+    upstream.stats.reset()
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(ETL_WORKERS) as executor:
+        html = extract_schedule(upstream)
+        events = sum(
+            not isinstance(item, dict)
+            for item in transform_schedule(upstream, html, executor)
+        )
+    seconds = time.perf_counter() - start
+
+    stats = upstream.stats
+    print(
+        f"{'HTTP/2' if http2 else 'HTTP/1.1':<9} {events:4d} events "
+        f"{seconds:7.2f} s {stats.requests:5d} requests "
+        f"{stats.bytes_downloaded / 1024:9.1f} KiB downloaded "
+        f"{stats.bytes_decoded / 1024:9.1f} KiB decoded"
+    )
+    upstream.client.close()
+
+
+if __name__ == "__main__":
+    for http2 in (False, True):
+        run(http2, DEFAULT_COMPANY_ID)
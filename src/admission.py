@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import math
+import os
+from collections import defaultdict
+
+from fastapi import HTTPException
+
+from scraper import BROWSER_SLOTS, Scraper
+
+MAX_QUEUED = int(os.environ.get("CHECK_IN_MAX_QUEUED", 16))
+MAX_PER_USER = int(os.environ.get("CHECK_IN_MAX_PER_USER", 5))
+INITIAL_JOB_SECONDS = 10.0
+
+
+class AdmissionController:
+    """
+    Sheds check-in requests once too much work is already in flight.
+
+    Up to `BROWSER_SLOTS` jobs run at once and at most `MAX_QUEUED` more may
+    wait behind them; each user may have `MAX_PER_USER` jobs outstanding.
+    Requests that could never fit under those caps get a 413. Requests rejected
+    because of the current load get a 429 whose Retry-After is estimated from
+    the running average job duration.
+    """
+
+    def __init__(self) -> None:
+        self.outstanding = 0
+        self.per_user: dict[int, int] = defaultdict(int)
+        self.job_seconds = INITIAL_JOB_SECONDS
+
+    @property
+    def in_flight(self) -> int:
+        """Jobs currently holding a browser slot; warm-page jobs never take one."""
+        return Scraper.slots_in_use
+
+    @property
+    def queued(self) -> int:
+        return max(0, self.outstanding - self.in_flight)
+
+    def admit(self, user_id: int, count: int = 1) -> None:
+        """
+        Raises a 429 if `count` more check-ins for the user would exceed a cap
+        right now, or a 413 if `count` alone exceeds one.
+        """
+        capacity = BROWSER_SLOTS + MAX_QUEUED
+        limit = min(MAX_PER_USER, capacity)
+        if count > limit:
+            logging.warning(f"Rejecting {count} check ins: over the limit of {limit}")
+            raise HTTPException(
+                status_code=413,
+                detail=f"At most {limit} check ins can be requested at once.",
+            )
+
+        excess = self.outstanding + count - capacity
+        if excess > 0:
+            waves = math.ceil(excess / BROWSER_SLOTS)
+            self._reject("Too many check ins in progress.", waves * self.job_seconds)
+
+        if self.per_user[user_id] + count > MAX_PER_USER:
+            self._reject(
+                f"Too many check ins in progress for user {user_id}.",
+                self.job_seconds,
+            )
+
+    def _reject(self, detail: str, retry_after: float) -> None:
+        logging.warning(
+            f"Shedding check in: {detail} ({self.in_flight} in flight, {self.queued} queued)"
+        )
+        raise HTTPException(
+            status_code=429,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    def track(self, user_id: int, task: asyncio.Task) -> None:
+        """
+        Counts an admitted job until its task finishes.
+
+        The task's result, the seconds it worked after getting a page or browser
+        slot, feeds the average job duration; time spent waiting for a slot does not.
+        """
+        self.outstanding += 1
+        self.per_user[user_id] += 1
+
+        def done(task: asyncio.Task) -> None:
+            self.outstanding -= 1
+            self.per_user[user_id] -= 1
+            if not self.per_user[user_id]:
+                del self.per_user[user_id]
+            if task.cancelled() or task.exception() is not None:
+                return
+            worked = task.result()
+            if worked is not None:
+                self.job_seconds = 0.8 * self.job_seconds + 0.2 * worked
+
+        task.add_done_callback(done)
@@ -1,97 +1,258 @@
 import concurrent.futures
 import logging
 import os
+import queue
 import sqlite3
 import sys
 import time
-from typing import List
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Iterable, Iterator
 
-from selectolax.parser import HTMLParser
+from selectolax.parser import HTMLParser, Node
 
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 
-from models import Event
+from dependencies import COMPANY_IDS, Utils
+from models import EventRecord
 from scraper import Scraper
 
-scraper = Scraper()
+CHUNK_SIZE = int(os.environ.get("ETL_CHUNK_SIZE", 100))
+ETL_WORKERS = int(os.environ.get("ETL_WORKERS", 8))
+QUEUED_CHUNKS = int(os.environ.get("ETL_QUEUED_CHUNKS", 4))
+TRACKED_COLUMNS = ("status", "location", "instructor", "start", "end")
+UPSERT_EVENT = """
+    INSERT INTO event (event_id, status, url, created, updated, title, location, instructor, start, end, company_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(event_id) DO UPDATE SET
+        status=excluded.status,
+        updated=excluded.updated,
+        location=excluded.location,
+        instructor=excluded.instructor,
+        start=excluded.start,
+        end=excluded.end
+"""
 
 
-def extract_schedule() -> str:
-    """Fetches and returns HTML content from the given URL."""
+def extract_schedule(scraper: Scraper) -> str:
+    """Fetches and returns the HTML content of a company's schedule hub."""
     logging.info(f"Fetching HTML content from {scraper.baseurl}/hub")
     response = scraper.get_page(f"{scraper.baseurl}/hub")
     html = response.text
     return html
 
 
-def transform_schedule_item(item) -> Event:
-    """Parses a single HTML item to extract and transform schedule information into an Event object."""
-    return scraper.parse_schedule_item(item)
+def parse_item(scraper: Scraper, elem: Node) -> EventRecord | dict:
+    """Parses one schedule item, returning a failure record instead of raising."""
+    try:
+        return scraper.parse_schedule_item(elem)
+    except Exception as e:
+        link = elem.css_first("strong a.with-icon")
+        url = link.attrs.get("href") if link else None
+        logging.error(f"Failed to parse schedule item {url}: {e}")
+        return {"url": url, "error": str(e)}
 
 
-def transform_schedule(html: str) -> List[Event]:
-    """Parses HTML to extract and transform schedule information into Event objects."""
+def transform_schedule(
+    scraper: Scraper, html: str, executor: concurrent.futures.Executor
+) -> Iterator[EventRecord | dict]:
+    """
+    Parses HTML to extract and transform schedule information into Event objects.
+
+    Items that fail to parse are yielded as `{"url", "error"}` dicts so one bad
+    item does not end the company's schedule.
+    """
     logging.info(f"Parsing HTML to extract schedule items")
     content = HTMLParser(html)
     raw_schedule_items = content.css(
         "div.instances-for-day div.instance div.grid-x.grid-padding-x div.cell.auto div.instance__content"
     )
+    yield from executor.map(partial(parse_item, scraper), raw_schedule_items)
 
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        events = list(executor.map(transform_schedule_item, raw_schedule_items))
-
-    return events
-
-
-def load_schedule(cur: sqlite3.Cursor, batch: list[Event]) -> None:
-    """Inserts multiple events into the database."""
-    logging.info(f"Loading {len(batch)} schedule items to database")
-    values = []
-    for item in batch:
-        values.append(
-            (
-                item.id,
-                item.status,
-                item.url,
-                item.created,
-                item.updated,
-                item.title,
-                item.location,
-                item.instructor,
-                item.start,
-                item.end,
-            )
-        )
 
+def sync_company(
+    company_id: int,
+    executor: concurrent.futures.Executor,
+    chunks: queue.Queue,
+    chunk_size: int = CHUNK_SIZE,
+) -> None:
+    """
+    Extracts and transforms one company's schedule onto `chunks`.
+
+    Events are put as `(company_id, chunk)` in lists of `chunk_size` as they are
+    parsed, followed by `(company_id, None)` once the company is done or has
+    failed, so a single writer can load them while parsing continues. Detail pages
+    are fetched on `executor`, which is shared by all companies so the run as a
+    whole stays within `ETL_WORKERS` concurrent requests.
+    """
+    try:
+        scraper = Scraper(company_id)
+        html = extract_schedule(scraper)
+        events = transform_schedule(scraper, html, executor)
+        for chunk in _chunked(events, chunk_size):
+            chunks.put((company_id, chunk))
+    finally:
+        chunks.put((company_id, None))
+
+
+@dataclass
+class LoadReport:
+    """Row counts and failures collected while loading the schedule."""
+
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    failed: list[dict] = field(default_factory=list)
+    unparsed: list[dict] = field(default_factory=list)
+
+
+def _event_row(item: EventRecord) -> tuple:
+    return tuple(getattr(item, name) for name in item.__slots__)
+
+
+def _chunked(
+    events: Iterable[EventRecord | dict], size: int
+) -> Iterator[list[EventRecord | dict]]:
+    chunk = []
+    for event in events:
+        chunk.append(event)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _load_chunk(
+    cur: sqlite3.Cursor, chunk: list[EventRecord], report: LoadReport
+) -> None:
+    """
+    Upserts a single chunk of events inside its own transaction.
+
+    The comparison against existing rows runs inside the same write transaction,
+    so the reported counts match what was written.
+    """
+    ids = [item.id for item in chunk]
+    placeholders = ", ".join("?" for _ in ids)
+    cur.execute("BEGIN IMMEDIATE")
     try:
-        cur.executemany(
-            """
-            INSERT INTO event (event_id, status, url, created, updated, title, location, instructor, start, end)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(event_id) DO UPDATE SET
-                status=excluded.status,
-                location=excluded.location,
-                instructor=excluded.instructor,
-                start=excluded.start,
-                end=excluded.end
+        cur.execute(
+            f"""
+            SELECT event_id, {", ".join(TRACKED_COLUMNS)} FROM event
+            WHERE event_id IN ({placeholders})
             """,
-            values,
+            ids,
         )
+        existing = {row[0]: row[1:] for row in cur.fetchall()}
+
+        inserts, updates, unchanged = [], [], 0
+        for item in chunk:
+            current = existing.get(item.id)
+            if current is None:
+                inserts.append(_event_row(item))
+            elif current != tuple(getattr(item, column) for column in TRACKED_COLUMNS):
+                updates.append(_event_row(item))
+            else:
+                unchanged += 1
+
+        cur.executemany(UPSERT_EVENT, inserts + updates)
+        cur.execute("COMMIT")
+    except Exception:
+        cur.execute("ROLLBACK")
+        raise
+
+    report.inserted += len(inserts)
+    report.updated += len(updates)
+    report.unchanged += unchanged
+
+
+def load_chunk(
+    cur: sqlite3.Cursor, chunk: list[EventRecord | dict], report: LoadReport
+) -> None:
+    """
+    Loads a chunk of events, recording it in the report as failed on error.
+
+    Items that failed to parse are recorded as unparsed and skipped.
+    """
+    report.unparsed.extend(item for item in chunk if isinstance(item, dict))
+    chunk = [item for item in chunk if not isinstance(item, dict)]
+    if not chunk:
+        return
+
+    try:
+        _load_chunk(cur, chunk, report)
     except Exception as e:
-        logging.error(f"Error during bulk insertion: {e}")
+        logging.error(f"Error loading chunk of {len(chunk)} schedule items: {e}")
+        report.failed.append(
+            {"event_ids": [item.id for item in chunk], "error": str(e)}
+        )
+
+
+def load_schedule(
+    cur: sqlite3.Cursor,
+    events: Iterable[EventRecord | dict],
+    chunk_size: int = CHUNK_SIZE,
+) -> LoadReport:
+    """
+    Upserts events into the database in transactions of `chunk_size` rows.
+
+    The connection behind `cur` must be in autocommit mode
+    (`isolation_level = None`) so each chunk is committed explicitly. A chunk
+    that fails is rolled back and recorded in the report, as are items that
+    failed to parse; loading continues with the next one.
+    """
+    report = LoadReport()
+    for chunk in _chunked(events, chunk_size):
+        load_chunk(cur, chunk, report)
+
+    logging.info(
+        f"Loaded schedule: {report.inserted} inserted, {report.updated} updated, "
+        f"{report.unchanged} unchanged, {len(report.failed)} failed chunks, "
+        f"{len(report.unparsed)} unparsed items"
+    )
+    return report
 
 
 if __name__ == "__main__":
     start = time.perf_counter()
-    html = extract_schedule()
-    schedule = transform_schedule(html)
+    Utils.migrate_schema()
 
-    with sqlite3.connect("./src/db/database.db") as conn:
+    with (
+        concurrent.futures.ThreadPoolExecutor(ETL_WORKERS) as pages,
+        concurrent.futures.ThreadPoolExecutor(len(COMPANY_IDS)) as companies,
+        sqlite3.connect("./src/db/database.db") as conn,
+    ):
         conn.isolation_level = None
         cur = conn.cursor()
-        batch = [event for event in schedule]
-        load_schedule(cur, batch)
-        conn.commit()
+        chunks = queue.Queue(QUEUED_CHUNKS)
+        reports = {company_id: LoadReport() for company_id in COMPANY_IDS}
+        futures = {
+            company_id: companies.submit(sync_company, company_id, pages, chunks)
+            for company_id in COMPANY_IDS
+        }
+        running = len(futures)
+        while running:
+            company_id, chunk = chunks.get()
+            if chunk is not None:
+                load_chunk(cur, chunk, reports[company_id])
+                continue
+
+            running -= 1
+            try:
+                futures[company_id].result()
+                report = reports[company_id]
+                stats = Scraper(company_id).stats
+                logging.info(
+                    f"Company {company_id}: {report.inserted} inserted, "
+                    f"{report.updated} updated, {report.unchanged} unchanged, "
+                    f"{len(report.failed)} failed chunks, "
+                    f"{len(report.unparsed)} unparsed items, "
+                    f"{stats.requests} upstream requests, "
+                    f"{stats.bytes_downloaded} bytes downloaded "
+                    f"({stats.bytes_decoded} decoded)"
+                )
+            except Exception as e:
+                logging.error(f"Failed to sync company {company_id}: {e}")
 
     end = time.perf_counter()
     runtime = "{:.4f}".format(end - start)
@@ -0,0 +1,99 @@
+import logging
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from dependencies import Utils
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+RETENTION_DAYS = int(os.environ.get("RETENTION_DAYS", 30))
+ARCHIVE_PATH = os.environ.get("ARCHIVE_PATH", "./src/db/archive.db")
+VACUUM_THRESHOLD = float(os.environ.get("VACUUM_THRESHOLD", 0.2))
+
+EXPIRED_EVENTS = """
+    SELECT event_id FROM main.event WHERE COALESCE("end", start, updated) < :cutoff
+"""
+EXPIRED_CHECK_INS = f"""
+    created < :cutoff OR event_id IN ({EXPIRED_EVENTS})
+"""
+
+
+def attach_archive(cur: sqlite3.Cursor, path: str) -> None:
+    """Attaches the archive database, creating its tables with the hot tables' columns."""
+    cur.execute("ATTACH DATABASE ? AS archive", (path,))
+    for table in ("event", "check_in"):
+        cur.execute(
+            f'CREATE TABLE IF NOT EXISTS archive."{table}" AS SELECT * FROM main."{table}" WHERE 0'
+        )
+
+
+def archive(cur: sqlite3.Cursor, cutoff: str) -> tuple[int, int]:
+    """
+    Moves events that ended before `cutoff`, their check-ins, and any other
+    check-ins created before `cutoff` into the archive, in one transaction.
+
+    Returns the number of events and check-ins moved.
+    """
+    params = {"cutoff": cutoff}
+    cur.execute("BEGIN")
+    try:
+        cur.execute(
+            f"INSERT INTO archive.check_in SELECT * FROM main.check_in WHERE {EXPIRED_CHECK_INS}",
+            params,
+        )
+        check_ins = cur.rowcount
+        cur.execute(f"DELETE FROM main.check_in WHERE {EXPIRED_CHECK_INS}", params)
+
+        cur.execute(
+            f"INSERT INTO archive.event SELECT * FROM main.event WHERE event_id IN ({EXPIRED_EVENTS})",
+            params,
+        )
+        events = cur.rowcount
+        cur.execute(
+            f"DELETE FROM main.event WHERE event_id IN ({EXPIRED_EVENTS})", params
+        )
+        cur.execute("COMMIT")
+    except Exception:
+        cur.execute("ROLLBACK")
+        raise
+
+    return events, check_ins
+
+
+def compact(cur: sqlite3.Cursor, threshold: float = VACUUM_THRESHOLD) -> None:
+    """Refreshes query planner statistics and vacuums once enough pages are free."""
+    cur.execute("ANALYZE main")
+    cur.execute("PRAGMA main.page_count")
+    pages = cur.fetchone()[0]
+    cur.execute("PRAGMA main.freelist_count")
+    free = cur.fetchone()[0]
+    if pages and free / pages >= threshold:
+        logging.info(f"Vacuuming database: {free} of {pages} pages free")
+        cur.execute("VACUUM main")
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    Utils.migrate_schema()
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=RETENTION_DAYS)).isoformat()
+
+    with sqlite3.connect("./src/db/database.db") as conn:
+        conn.isolation_level = None
+        cur = conn.cursor()
+        attach_archive(cur, ARCHIVE_PATH)
+        events, check_ins = archive(cur, cutoff)
+        logging.info(
+            f"Archived {events} events and {check_ins} check ins older than {cutoff}"
+        )
+        compact(cur)
+
+    end = time.perf_counter()
+    runtime = "{:.4f}".format(end - start)
+    logging.info(f"Runtime: {runtime} s")
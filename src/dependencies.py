@@ -1,60 +1,180 @@
 import logging
+import os
 import re
 import sqlite3
 from datetime import datetime
 from typing import Literal, Optional
 
+import orjson
 import pytz
+from fastapi import HTTPException, Query
 
-from models import CheckIn, Event, User
+from models import CheckInRecord, EventRecord, User, UserRecord
+from name_index import NameIndex
 
 NY_TZ = pytz.timezone("America/New_York")
 NAME_REGEX = re.compile(r"<[^>]+>")
+COMPANY_IDS = [int(id) for id in os.environ.get("COMPANY_IDS", "12433").split(",")]
+DEFAULT_COMPANY_ID = COMPANY_IDS[0]
+CHECK_IN_COLUMNS = (
+    "check_in_id, event_id, user_id, status, created, updated, company_id"
+)
+EVENT_FIELDS = (
+    "id",
+    "status",
+    "url",
+    "created",
+    "updated",
+    "title",
+    "location",
+    "instructor",
+    "start",
+    "end",
+    "company_id",
+)
+
+
+def get_company_id(
+    company_id: int = Query(
+        DEFAULT_COMPANY_ID, description="The Punchpass company (studio) ID."
+    )
+) -> int:
+    """Resolves the studio a request targets, defaulting to the first configured one."""
+    if company_id not in COMPANY_IDS:
+        raise HTTPException(status_code=404, detail=f"Company {company_id} not found.")
+    return company_id
 
 
 class Utils:
+    _schedule_cache: dict[int, tuple[tuple, bytes]] = {}
+
     @staticmethod
-    def fetch_events_for_today() -> list[dict] | None:
+    def migrate_schema() -> None:
+        """
+        Brings databases created by older versions up to the current schema.
+
+        Adds the company_id column and its indexes, the per-company event revision
+        and the triggers that bump it, and swaps the user_id and event_id values of
+        check-ins written before those columns were named explicitly on insert
+        (tracked with `PRAGMA user_version`).
+        """
+        with sqlite3.connect("./src/db/database.db") as conn:
+            # One write transaction, so migrations started concurrently by the API,
+            # the ETL and the retention job run one after another and each
+            # re-reads user_version instead of applying the swap twice.
+            conn.isolation_level = None
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                cur.execute("PRAGMA user_version")
+                if cur.fetchone()[0] < 1:
+                    logging.info("Swapping user_id and event_id of existing check ins")
+                    cur.execute(
+                        "UPDATE check_in SET user_id = event_id, event_id = user_id"
+                    )
+                    cur.execute("PRAGMA user_version = 1")
+                for table in ("event", "user", "check_in"):
+                    cur.execute(f'PRAGMA table_info("{table}")')
+                    if "company_id" not in {column[1] for column in cur.fetchall()}:
+                        logging.info(f"Adding company_id to {table}")
+                        cur.execute(f"""
+                            ALTER TABLE "{table}"
+                            ADD COLUMN company_id INTEGER NOT NULL DEFAULT {DEFAULT_COMPANY_ID}
+                            """)
+                cur.execute(
+                    "CREATE INDEX IF NOT EXISTS event_company_start ON event(company_id, start)"
+                )
+                cur.execute(
+                    "CREATE INDEX IF NOT EXISTS user_company_email ON user(company_id, email)"
+                )
+                cur.execute(
+                    "CREATE INDEX IF NOT EXISTS check_in_company_updated ON check_in(company_id, updated)"
+                )
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS event_revision (
+                        company_id INTEGER PRIMARY KEY,
+                        revision INTEGER NOT NULL
+                    )
+                    """)
+                for operation, row in (
+                    ("INSERT", "NEW"),
+                    ("UPDATE", "NEW"),
+                    ("DELETE", "OLD"),
+                ):
+                    cur.execute(f"""
+                        CREATE TRIGGER IF NOT EXISTS event_revision_{operation.lower()}
+                        AFTER {operation} ON event
+                        BEGIN
+                            INSERT INTO event_revision (company_id, revision)
+                            VALUES ({row}.company_id, 1)
+                            ON CONFLICT (company_id) DO UPDATE SET revision = revision + 1;
+                        END
+                        """)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def fetch_events_for_today(company_id: int) -> list[dict] | None:
         """Fetches schedule items from the database that have the start date or end date as today."""
         today = datetime.now(NY_TZ).date().isoformat()
         logging.info(f"today: {today}")
-        logging.info(f"Fetching today's events from the database")
+        logging.info(
+            f"Fetching today's events for company {company_id} from the database"
+        )
         with sqlite3.connect("./src/db/database.db") as conn:
             cur = conn.cursor()
             query = """
                     SELECT * FROM event 
-                    WHERE SUBSTR(DATE(start, 'localtime'), 1, 10) = ?
+                    WHERE company_id = ?
+                    AND SUBSTR(DATE(start, 'localtime'), 1, 10) = ?
                     AND title NOT LIKE "Sensual Move%"
                     AND title NOT LIKE "Private Session%"
                     ORDER BY start ASC
                     """
-            cur.execute(query, (today,))
+            cur.execute(query, (company_id, today))
             items = cur.fetchall()
 
         if not items:
             return None
 
-        schedule = []
-        for item in items:
-            event = Event(
-                id=item[0],
-                status=item[1],
-                url=item[2],
-                created=item[3],
-                updated=item[4],
-                title=item[5],
-                location=item[6],
-                instructor=item[7],
-                start=item[8],
-                end=item[9],
+        return [dict(zip(EVENT_FIELDS, item)) for item in items]
+
+    @staticmethod
+    def fetch_schedule_json(company_id: int) -> bytes | None:
+        """
+        Returns a company's schedule for today as a pre-encoded JSON body.
+
+        The body is cached until the day changes or the company's event revision,
+        which triggers bump on every insert, update or delete, moves.
+        """
+        today = datetime.now(NY_TZ).date().isoformat()
+        with sqlite3.connect("./src/db/database.db") as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT revision FROM event_revision WHERE company_id = ?",
+                (company_id,),
             )
-            schedule.append(event.model_dump())
-        return schedule
+            row = cur.fetchone()
+            revision = (today, row[0] if row else 0)
+
+        cached = Utils._schedule_cache.get(company_id)
+        if cached and cached[0] == revision:
+            return cached[1]
+
+        schedule = Utils.fetch_events_for_today(company_id)
+        if not schedule:
+            return None
+
+        body = orjson.dumps({"schedule": schedule})
+        Utils._schedule_cache[company_id] = (revision, body)
+        return body
 
     @staticmethod
     def fetch_schedule_item_by_id(
-        item_id: int, type: Optional[Literal[1]] = None
-    ) -> dict | Event | None:
+        item_id: int, company_id: int, type: Optional[Literal[1]] = None
+    ) -> dict | EventRecord | None:
         """Fetches a single schedule item from the database matching the given ID."""
         logging.info(f"Fetching event from the database with ID: {item_id}")
 
@@ -63,32 +183,21 @@ class Utils:
             query = """
                     SELECT * FROM event 
                     WHERE event_id = ?
+                    AND company_id = ?
                     """
-            cur.execute(query, (item_id,))
+            cur.execute(query, (item_id, company_id))
             item = cur.fetchone()
 
             if item:
-                event = Event(
-                    id=item[0],
-                    status=item[1],
-                    url=item[2],
-                    created=item[3],
-                    updated=item[4],
-                    title=item[5],
-                    location=item[6],
-                    instructor=item[7],
-                    start=item[8],
-                    end=item[9],
-                )
                 if type is None:
-                    return event.model_dump()
+                    return dict(zip(EVENT_FIELDS, item))
                 else:
-                    return event
+                    return EventRecord(*item)
 
             return None
 
     @staticmethod
-    def fetch_user_by_email(email: str) -> dict | None:
+    def fetch_user_by_email(email: str, company_id: int) -> dict | None:
         """Fetches a single user from the database matching the given email."""
         logging.info(f"Fetching user from the database with email: {email}")
 
@@ -96,81 +205,86 @@ class Utils:
             cur = conn.cursor()
             query = """
                     SELECT * FROM user 
-                    WHERE email = ?
+                    WHERE company_id = ?
+                    AND email = ?
                     """
-            cur.execute(query, (email,))
+            cur.execute(query, (company_id, email))
             item = cur.fetchone()
 
             if item:
-                user = User(
-                    id=item[0],
-                    first_name=item[1],
-                    last_name=item[2],
-                    phone=item[3],
-                    email=item[4],
-                )
-                return user.model_dump()
+                return UserRecord(*item).to_dict()
 
             return None
 
     @staticmethod
-    def fetch_user_by_name(first_name: str, last_name: str) -> User | None:
-        """Fetches a single user from the database matching the given name."""
-        logging.info(
-            f"Fetching user from the database with name: {first_name} {last_name}"
-        )
+    def fetch_check_in(id: str) -> CheckInRecord | None:
+        """Fetches a single Check In from the database matching the given ID."""
+        logging.info(f"Fetching Check In from the database with id: {id}")
 
         with sqlite3.connect("./src/db/database.db") as conn:
             cur = conn.cursor()
-            query = """
-                    SELECT * FROM user 
-                    WHERE first_name = ?
-                    AND last_name = ?
+            query = f"""
+                    SELECT {CHECK_IN_COLUMNS} FROM check_in 
+                    WHERE check_in_id = ?
                     """
-            cur.execute(query, (first_name, last_name))
+            cur.execute(query, (id,))
             item = cur.fetchone()
 
             if item:
-                user = User(
-                    id=item[0],
-                    first_name=item[1],
-                    last_name=item[2],
-                    phone=item[3],
-                    email=item[4],
-                )
-                return user
+                return CheckInRecord(*item)
 
             return None
 
     @staticmethod
-    def fetch_check_in(id: str) -> CheckIn | None:
-        """Fetches a single user from the database matching the given name."""
-        logging.info(f"Fetching Check In from the database with id: {id}")
+    def fetch_recent_check_ins(
+        company_id: int, since: str
+    ) -> list[tuple[CheckInRecord, UserRecord]]:
+        """Fetches a company's finished Check Ins updated since the given time, with their users."""
+        logging.info(
+            f"Fetching Check Ins for company {company_id} updated since {since}"
+        )
 
         with sqlite3.connect("./src/db/database.db") as conn:
             cur = conn.cursor()
             query = """
-                    SELECT * FROM check_in 
-                    WHERE check_in_id = ?
+                    SELECT check_in.check_in_id, check_in.event_id, check_in.user_id,
+                        check_in.status, check_in.created, check_in.updated,
+                        check_in.company_id, user.*
+                    FROM check_in
+                    JOIN user ON user.user_id = check_in.user_id
+                    WHERE check_in.company_id = ?
+                    AND check_in.updated >= ?
+                    AND check_in.status IN ('confirmed', 'failed')
                     """
-            cur.execute(query, (id,))
-            item = cur.fetchone()
+            cur.execute(query, (company_id, since))
+            return [
+                (CheckInRecord(*item[:7]), UserRecord(*item[7:]))
+                for item in cur.fetchall()
+            ]
 
-            if item:
-                check_in = CheckIn(
-                    id=item[0],
-                    event_id=item[1],
-                    user_id=item[2],
-                    status=item[3],
-                    created=item[4],
-                    updated=item[5],
+    @staticmethod
+    def update_check_in_statuses(check_ins: list[CheckInRecord]) -> None:
+        """Writes the status of many Check Ins in a single transaction."""
+        logging.info(f"Updating {len(check_ins)} Check In statuses")
+        with sqlite3.connect("./src/db/database.db") as conn:
+            cur = conn.cursor()
+            try:
+                cur.executemany(
+                    """
+                    UPDATE check_in SET status = ?, updated = ?
+                    WHERE check_in_id = ?
+                    """,
+                    [
+                        (check_in.status, check_in.updated, check_in.id)
+                        for check_in in check_ins
+                    ],
                 )
-                return check_in
-
-            return None
+                conn.commit()
+            except Exception as e:
+                logging.error(f"Error updating Check In statuses: {e}")
 
     @staticmethod
-    def load_user(user: User) -> None:
+    def load_user(user: User | UserRecord) -> None:
         """Inserts a single User into the database."""
         logging.info(f"Loading User {user.id} to database")
         with sqlite3.connect("./src/db/database.db") as conn:
@@ -179,11 +293,28 @@ class Utils:
                 cur.execute(
                     """
                     INSERT INTO user
-                    VALUES (?, ?, ?, ?, ?)
+                    VALUES (?, ?, ?, ?, ?, ?)
                     """,
-                    (user.id, user.first_name, user.last_name, user.phone, user.email),
+                    (
+                        user.id,
+                        user.first_name,
+                        user.last_name,
+                        user.phone,
+                        user.email,
+                        user.company_id,
+                    ),
                 )
                 conn.commit()
+                NameIndex().add(
+                    UserRecord(
+                        user.id,
+                        user.first_name,
+                        user.last_name,
+                        user.phone,
+                        user.email,
+                        user.company_id,
+                    )
+                )
             except sqlite3.IntegrityError:
                 logging.error(
                     "Duplicate entry found. Skipping insertion for duplicate."
@@ -192,7 +323,7 @@ class Utils:
                 logging.error(f"Error during insertion: {e}")
 
     @staticmethod
-    def load_check_in(check_in: CheckIn) -> None:
+    def load_check_in(check_in: CheckInRecord) -> None:
         """Inserts a Check In receipt into the database."""
         logging.info(f"Loading Check In {check_in.id} to database")
         with sqlite3.connect("./src/db/database.db") as conn:
@@ -200,8 +331,8 @@ class Utils:
             try:
                 cur.execute(
                     """
-                    INSERT INTO check_in
-                    VALUES (?, ?, ?, ?, ?, ?)
+                    INSERT INTO check_in (check_in_id, event_id, user_id, status, created, updated, company_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
                     ON CONFLICT(check_in_id) DO UPDATE SET
                         status=excluded.status,
                         updated=excluded.updated
@@ -213,6 +344,7 @@ class Utils:
                         check_in.status,
                         check_in.created,
                         check_in.updated,
+                        check_in.company_id,
                     ),
                 )
                 conn.commit()
@@ -233,7 +365,7 @@ class Utils:
         return cookies_for_playwright
 
     @staticmethod
-    def parse_user_data(response: dict) -> User | None:
+    def parse_user_data(response: dict, company_id: int) -> User | None:
         data_list = response.get("data")
 
         if not data_list:
@@ -252,6 +384,7 @@ class Utils:
             last_name=last_name,
             phone=phone,
             email=email,
+            company_id=company_id,
         )
 
     @staticmethod
@@ -1,10 +1,46 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
+from admission import AdmissionController
+from dependencies import COMPANY_IDS, Utils
+from name_index import NameIndex
+from reconciler import Reconciler
 from routers import schedule, users
 from scraper import Scraper
+from warmer import PageWarmer
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmer = None
+    if os.environ.get("WARM_PAGES", "1") == "1":
+        warmer = PageWarmer(app.state.scrapers)
+        for scraper in app.state.scrapers.values():
+            scraper.warmer = warmer
+        await warmer.start()
+    reconciler = None
+    if os.environ.get("RECONCILE", "1") == "1":
+        reconciler = Reconciler(app.state.scrapers, app.state.admission)
+        await reconciler.start()
+    yield
+    if reconciler:
+        await reconciler.stop()
+    for task in list(Scraper.jobs.values()):
+        task.cancel()
+    if warmer:
+        await warmer.stop()
+    await asyncio.gather(*Scraper.background, return_exceptions=True)
+    await Scraper.close_browser()
+
 
-app = FastAPI(title="Punchpass API", openapi_url="/openapi.json")
-app.state.scraper = Scraper()
+app = FastAPI(title="Punchpass API", openapi_url="/openapi.json", lifespan=lifespan)
+Utils.migrate_schema()
+app.state.scrapers = {company_id: Scraper(company_id) for company_id in COMPANY_IDS}
+app.state.name_index = NameIndex()
+app.state.admission = AdmissionController()
 
 app.include_router(schedule.router)
 app.include_router(users.router)
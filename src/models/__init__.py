@@ -1,3 +1,4 @@
 from .events import Event
 from .users import User
 from .check_ins import CheckIn
+from .records import CheckInRecord, EventRecord, UserRecord
@@ -8,3 +8,4 @@ class CheckIn(BaseModel):
     status: str = Field(examples=["confirmed"])
     created: str = Field(examples=["1970-01-01T00:00:00-00:00"])
     updated: str = Field(examples=["1970-01-01T00:00:00-00:00"])
+    company_id: int = Field(examples=[12433])
@@ -12,6 +12,7 @@ class Event(BaseModel):
     instructor: str
     start: str
     end: str
+    company_id: int
 
 
 class WriteUserToEvent(BaseModel):
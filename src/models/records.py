@@ -0,0 +1,77 @@
+from dataclasses import dataclass
+
+from .check_ins import CheckIn
+from .events import Event
+from .users import User
+
+
+@dataclass(slots=True)
+class EventRecord:
+    """Internal row type for `Event`, used between the scraper, ETL and database."""
+
+    id: int
+    status: str
+    url: str
+    created: str
+    updated: str
+    title: str
+    location: str
+    instructor: str
+    start: str
+    end: str
+    company_id: int
+
+    @classmethod
+    def from_model(cls, event: Event) -> "EventRecord":
+        return cls(*(getattr(event, name) for name in Event.model_fields))
+
+    def to_model(self) -> Event:
+        return Event.model_construct(**self.to_dict())
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+@dataclass(slots=True)
+class UserRecord:
+    """Internal row type for `User`."""
+
+    id: int
+    first_name: str
+    last_name: str
+    phone: str
+    email: str
+    company_id: int
+
+    @classmethod
+    def from_model(cls, user: User) -> "UserRecord":
+        return cls(*(getattr(user, name) for name in User.model_fields))
+
+    def to_model(self) -> User:
+        return User.model_construct(**self.to_dict())
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+@dataclass(slots=True)
+class CheckInRecord:
+    """Internal row type for `CheckIn`, mutated in place as a check-in progresses."""
+
+    id: str
+    event_id: int
+    user_id: int
+    status: str
+    created: str
+    updated: str
+    company_id: int
+
+    @classmethod
+    def from_model(cls, check_in: CheckIn) -> "CheckInRecord":
+        return cls(*(getattr(check_in, name) for name in CheckIn.model_fields))
+
+    def to_model(self) -> CheckIn:
+        return CheckIn.model_construct(**self.to_dict())
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
@@ -6,6 +6,7 @@ class User(BaseModel):
     last_name: str = Field(examples=["Doe"])
     phone: str = Field(examples=["1234567890"])
     email: str = Field(examples=["johndoe@example.com"])
+    company_id: int = Field(examples=[12433])
 
 
 class ReadUser(BaseModel):
@@ -0,0 +1,183 @@
+import logging
+import sqlite3
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Optional
+
+from slugify import slugify
+
+from models import UserRecord
+
+MIN_SCORE = 0.5
+AUTO_RESOLVE_SCORE = 0.85
+MIN_MARGIN = 0.15
+
+
+def normalize_name(first_name: str, last_name: str) -> str:
+    """Casefolds and transliterates a name to plain lowercase ASCII words."""
+    return slugify(f"{first_name} {last_name}", separator=" ")
+
+
+def trigrams(name: str) -> set[str]:
+    padded = f"  {name} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a: str, b: str) -> float:
+    """
+    Edit similarity of two normalized names, from 0.0 to 1.0.
+
+    A single typo in a name of five or more letters scores about 0.85 or more.
+    """
+    if a == b:
+        return 1.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+class NameIndex:
+    """
+    In-memory index of members by company, normalized name and name trigrams.
+
+    Loaded from the user table on first use and kept current by `Utils.load_user`.
+    """
+
+    _instance: Optional["NameIndex"] = None
+
+    def __new__(cls) -> "NameIndex":
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            logging.info("NameIndex instance created")
+        return cls._instance
+
+    def __init__(self) -> None:
+        if not hasattr(self, "users"):
+            self.users: dict[int, UserRecord] = {}
+            self.exact: dict[tuple[int, str], set[int]] = defaultdict(set)
+            self.grams: dict[tuple[int, str], set[int]] = defaultdict(set)
+            self.sizes: dict[int, int] = {}
+            self.parts: dict[int, tuple[str, str]] = {}
+            self._load()
+
+    def _load(self) -> None:
+        with sqlite3.connect("./src/db/database.db") as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT * FROM user")
+            for item in cur.fetchall():
+                self.add(UserRecord(*item))
+        logging.info(f"Indexed {len(self.users)} users by name")
+
+    def add(self, user: UserRecord) -> None:
+        """Adds or replaces a user in the index."""
+        if user.id in self.users:
+            self.remove(user.id)
+
+        key = normalize_name(user.first_name, user.last_name)
+        grams = trigrams(key)
+        self.users[user.id] = user
+        self.exact[(user.company_id, key)].add(user.id)
+        self.sizes[user.id] = len(grams)
+        self.parts[user.id] = (
+            slugify(user.first_name, separator=" "),
+            slugify(user.last_name, separator=" "),
+        )
+        for gram in grams:
+            self.grams[(user.company_id, gram)].add(user.id)
+
+    def remove(self, user_id: int) -> None:
+        user = self.users.pop(user_id, None)
+        if user is None:
+            return
+
+        key = normalize_name(user.first_name, user.last_name)
+        self._discard(self.exact, (user.company_id, key), user_id)
+        for gram in trigrams(key):
+            self._discard(self.grams, (user.company_id, gram), user_id)
+        del self.sizes[user_id]
+        del self.parts[user_id]
+
+    @staticmethod
+    def _discard(index: dict[tuple[int, str], set[int]], key, user_id: int) -> None:
+        """Removes a user from an index entry, dropping the entry once it is empty."""
+        user_ids = index.get(key)
+        if user_ids is None:
+            return
+        user_ids.discard(user_id)
+        if not user_ids:
+            del index[key]
+
+    def search(
+        self, company_id: int, first_name: str, last_name: str, limit: int = 5
+    ) -> list[tuple[UserRecord, float]]:
+        """
+        Returns up to `limit` of a company's users ranked by name similarity.
+
+        Candidates are found by trigram overlap on the whole name, then scored on
+        first and last name separately by edit similarity; a user's score is the
+        lower of the two, and users scoring under `MIN_SCORE`, such as those sharing
+        only a first or only a last name, are dropped. When the normalized name
+        matches exactly, only the exact matches are returned, at 1.0.
+        """
+        key = normalize_name(first_name, last_name)
+        exact = self.exact.get((company_id, key))
+        if exact:
+            return [(self.users[user_id], 1.0) for user_id in sorted(exact)][:limit]
+
+        grams = trigrams(key)
+        shared: dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for user_id in self.grams.get((company_id, gram), ()):
+                shared[user_id] += 1
+
+        first = slugify(first_name, separator=" ")
+        last = slugify(last_name, separator=" ")
+        matches = []
+        for user_id, count in shared.items():
+            if 2 * count / (len(grams) + self.sizes[user_id]) < MIN_SCORE:
+                continue
+            user_first, user_last = self.parts[user_id]
+            score = min(similarity(first, user_first), similarity(last, user_last))
+            if score >= MIN_SCORE:
+                matches.append((self.users[user_id], score))
+
+        matches.sort(key=lambda match: match[1], reverse=True)
+        return matches[:limit]
+
+    def resolve(
+        self, company_id: int, first_name: str, last_name: str
+    ) -> tuple[UserRecord | None, list[tuple[UserRecord, float]]]:
+        """
+        Resolves a name to a single user of the company.
+
+        Returns the user and the ranked candidates. The user is only set for a unique
+        exact match, or for a fuzzy match with one name exact and the other scoring
+        at least `AUTO_RESOLVE_SCORE` (a single typo), leading the runner-up by
+        `MIN_MARGIN`. Otherwise it is None and the caller decides from the
+        candidates, which are empty when no name is similar enough.
+        """
+        matches = self.search(company_id, first_name, last_name)
+        if not matches:
+            logging.info(f"No indexed user matches {first_name} {last_name}")
+            return None, []
+
+        user, score = matches[0]
+        runner_up = matches[1][1] if len(matches) > 1 else 0.0
+        user_first, user_last = self.parts[user.id]
+        one_exact = (
+            slugify(first_name, separator=" ") == user_first
+            or slugify(last_name, separator=" ") == user_last
+        )
+        if (
+            score < AUTO_RESOLVE_SCORE
+            or score - runner_up < MIN_MARGIN
+            or not one_exact
+        ):
+            logging.info(
+                f"Ambiguous name {first_name} {last_name}: "
+                f"{len(matches)} candidates, best score {score:.2f}"
+            )
+            return None, matches
+
+        logging.info(
+            f"Resolved {first_name} {last_name} to user {user.id} (score {score:.2f})"
+        )
+        return user, matches
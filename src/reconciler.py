@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import HTTPException
+from selectolax.parser import HTMLParser
+
+from dependencies import Utils
+from models import CheckInRecord, EventRecord, UserRecord
+from name_index import normalize_name
+
+RECONCILE_INTERVAL = int(os.environ.get("RECONCILE_INTERVAL_SECONDS", 300))
+RECONCILE_WINDOW = timedelta(
+    minutes=int(os.environ.get("RECONCILE_WINDOW_MINUTES", 60))
+)
+# The roster URL ({event}/attendances) and this selector are not yet verified
+# against a live roster page (pagination, "Last, First" names, extra cell text),
+# so a roster is only trusted to confirm check-ins, never to fail them.
+ROSTER_NAME_SELECTOR = "table.attendances tbody tr td.customer-name"
+
+
+class Reconciler:
+    """
+    Verifies finished check-ins against each event's upstream attendance roster.
+
+    Every `RECONCILE_INTERVAL` seconds, each of today's events with check-ins
+    updated within `RECONCILE_WINDOW` has its roster fetched once over HTTP.
+    Check-ins whose member is on the roster become `confirmed`; a member missing
+    from the roster never downgrades a `confirmed` check-in. Check-ins the job
+    itself marked `failed` and whose member is missing are re-queued once if
+    the event has not ended; re-queued check-in IDs are forgotten after
+    `RECONCILE_WINDOW`. A roster that cannot be fetched or parsed leaves the
+    event's check-ins untouched.
+    """
+
+    def __init__(self, scrapers: dict, admission) -> None:
+        self.scrapers = scrapers
+        self.admission = admission
+        self.requeued: dict[str, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+        logging.info("Reconciler started")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+        logging.info("Reconciler stopped")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(RECONCILE_INTERVAL)
+            for company_id in self.scrapers:
+                try:
+                    await self.reconcile(company_id)
+                except Exception as e:
+                    logging.error(f"Error reconciling company {company_id}: {e}")
+
+    def fetch_roster(self, company_id: int, event: EventRecord) -> set[str] | None:
+        """
+        Returns the normalized names on an event's attendance roster.
+
+        Returns None when the roster is unknown: the page could not be fetched,
+        or `ROSTER_NAME_SELECTOR` matched no rows, which more likely means the
+        markup changed than that the roster is empty.
+        """
+        response = self.scrapers[company_id].get_page(f"{event.url}/attendances")
+        if not response or response.status_code != 200:
+            logging.error(f"Failed to fetch attendance roster for event {event.id}")
+            return None
+
+        nodes = HTMLParser(response.text).css(ROSTER_NAME_SELECTOR)
+        if not nodes:
+            logging.warning(
+                f"No roster rows matched for event {event.id}; skipping reconciliation"
+            )
+            return None
+
+        return {normalize_name(node.text(strip=True), "") for node in nodes}
+
+    async def reconcile(self, company_id: int) -> None:
+        now = datetime.now(timezone.utc)
+        since = (now - RECONCILE_WINDOW).isoformat()
+        self.requeued = {
+            id: requeued
+            for id, requeued in self.requeued.items()
+            if now - requeued < RECONCILE_WINDOW
+        }
+        by_event: dict[int, list[tuple[CheckInRecord, UserRecord]]] = defaultdict(list)
+        for check_in, user in Utils.fetch_recent_check_ins(company_id, since):
+            by_event[check_in.event_id].append((check_in, user))
+
+        events = [
+            EventRecord(**event)
+            for event in Utils.fetch_events_for_today(company_id) or []
+            if event["id"] in by_event
+        ]
+        if not events:
+            return
+
+        rosters = await asyncio.gather(
+            *(
+                asyncio.to_thread(self.fetch_roster, company_id, event)
+                for event in events
+            )
+        )
+
+        updated = []
+        misses = []
+        for event, roster in zip(events, rosters):
+            if roster is None:
+                continue
+            for check_in, user in by_event[event.id]:
+                name = normalize_name(user.first_name, user.last_name)
+                if name in roster:
+                    if check_in.status != "confirmed":
+                        check_in.status = "confirmed"
+                        check_in.updated = now.isoformat()
+                        updated.append(check_in)
+                elif (
+                    check_in.status == "failed"
+                    and event.end
+                    and datetime.fromisoformat(event.end) > now
+                ):
+                    misses.append((user, event, check_in))
+
+        if updated:
+            Utils.update_check_in_statuses(updated)
+        logging.info(
+            f"Reconciled {len(events)} events for company {company_id}: "
+            f"{len(updated)} check ins confirmed, {len(misses)} failed and missing from rosters"
+        )
+
+        for user, event, check_in in misses:
+            if check_in.id in self.requeued:
+                continue
+            try:
+                self.admission.admit(user.id)
+            except HTTPException:
+                logging.info(f"Not re-queuing check in {check_in.id}: over capacity")
+                continue
+            self.requeued[check_in.id] = now
+            check_in.status = "pending"
+            check_in.updated = now.isoformat()
+            Utils.load_check_in(check_in)
+            task = self.scrapers[company_id].start_check_in(user, event, check_in)
+            self.admission.track(user.id, task)
@@ -1,43 +1,85 @@
-import asyncio
 import uuid
 from datetime import datetime, timezone
 from typing import Annotated
 
-from fastapi import APIRouter, HTTPException, Path, Request
+from fastapi import APIRouter, Depends, HTTPException, Path, Request, Response
+from fastapi.responses import ORJSONResponse
 
-from dependencies import Utils
-from models import CheckIn
+from dependencies import Utils, get_company_id
+from models import CheckIn, CheckInRecord, UserRecord
 from models.events import WriteUserToEvent, WriteUserToManyEvents
+from scraper import Scraper
 
 router = APIRouter(prefix="/schedule")
 
 
+def resolve_user(
+    request: Request, company_id: int, first_name: str, last_name: str
+) -> UserRecord:
+    """
+    Resolves a member through the name index.
+
+    Raises 404 when no member is similar, and 409 with the ranked candidates when
+    the name does not identify a single member with confidence.
+    """
+    user, candidates = request.app.state.name_index.resolve(
+        company_id, first_name, last_name
+    )
+    if user:
+        return user
+
+    if not candidates:
+        raise HTTPException(
+            status_code=404,
+            detail=f"User {first_name} {last_name} not found.",
+        )
+    raise HTTPException(
+        status_code=409,
+        detail={
+            "detail": f"User {first_name} {last_name} is ambiguous. Retry with a candidate's exact name.",
+            "candidates": [
+                {
+                    "id": candidate.id,
+                    "first_name": candidate.first_name,
+                    "last_name": candidate.last_name,
+                    "score": round(score, 2),
+                }
+                for candidate, score in candidates
+            ],
+        },
+    )
+
+
 @router.get("/", response_model=dict[str, list[dict]], status_code=200)
-async def read_schedule() -> dict[str, list[dict]]:
-    schedule = Utils.fetch_events_for_today()
+def read_schedule(
+    company_id: Annotated[int, Depends(get_company_id)]
+) -> Response:
+    schedule = Utils.fetch_schedule_json(company_id)
 
     if not schedule:
         raise HTTPException(status_code=404, detail="No events found for today.")
 
-    return {"schedule": schedule}
+    return Response(content=schedule, media_type="application/json")
 
 
 @router.get("/{id}", response_model=dict, status_code=200)
-async def read_event(
-    id: Annotated[int, Path(title="The ID of the event to get")]
+def read_event(
+    id: Annotated[int, Path(title="The ID of the event to get")],
+    company_id: Annotated[int, Depends(get_company_id)],
 ):
-    event = Utils.fetch_schedule_item_by_id(id)
+    event = Utils.fetch_schedule_item_by_id(id, company_id)
 
     if not event:
         raise HTTPException(status_code=404, detail=f"Event {id} not found.")
 
-    return event
+    return ORJSONResponse(event)
 
 @router.post("/{id}/check-in", status_code=202)
 async def write_user_to_event(
     id: Annotated[int, Path(title="The ID of the event to get")],
     payload: WriteUserToEvent,
     request: Request,
+    company_id: Annotated[int, Depends(get_company_id)],
 ) -> dict[str, str]:
     event_id = id
     first_name = payload.first_name
@@ -49,14 +91,9 @@ async def write_user_to_event(
             detail="First and last name required for operation.",
         )
 
-    user = Utils.fetch_user_by_name(first_name, last_name)
-    if not user:
-        raise HTTPException(
-            status_code=404,
-            detail=f"User {first_name} {last_name} not found.",
-        )
+    user = resolve_user(request, company_id, first_name, last_name)
 
-    event = Utils.fetch_schedule_item_by_id(event_id, 1)
+    event = Utils.fetch_schedule_item_by_id(event_id, company_id, 1)
     if not event:
         raise HTTPException(
             status_code=404,
@@ -64,21 +101,24 @@ async def write_user_to_event(
         )
 
     name = f"{user.first_name} {user.last_name}"
+    request.app.state.admission.admit(user.id)
 
-    check_in = CheckIn(
+    check_in = CheckInRecord(
         id=str(uuid.uuid4()),
         event_id=event.id,
         user_id=user.id,
         status="pending",
         created=datetime.now(timezone.utc).isoformat(),
         updated=datetime.now(timezone.utc).isoformat(),
+        company_id=company_id,
     )
     Utils.load_check_in(check_in)
 
     try:
-        asyncio.create_task(
-            request.app.state.scraper.user_check_in(user, event, check_in)
+        task = request.app.state.scrapers[company_id].start_check_in(
+            user, event, check_in
         )
+        request.app.state.admission.track(user.id, task)
         return {
             "detail": f"Check in request for {name} accepted",
             "id": check_in.id,
@@ -96,6 +136,7 @@ async def write_user_to_event(
 async def write_user_to_many_events(
     payload: WriteUserToManyEvents,
     request: Request,
+    company_id: Annotated[int, Depends(get_company_id)],
 ) -> dict[str, str]:
     event_ids = payload.event_ids
     first_name = payload.first_name
@@ -109,18 +150,13 @@ async def write_user_to_many_events(
         )
 
     # Fetch user
-    user = Utils.fetch_user_by_name(first_name, last_name)
+    user = resolve_user(request, company_id, first_name, last_name)
     name = f"{first_name} {last_name}"
-    if not user:
-        raise HTTPException(
-            status_code=404,
-            detail=f"User {name} not found.",
-        )
 
     # Fetch events
     events = []
     for event_id in event_ids:
-        event = Utils.fetch_schedule_item_by_id(event_id, 1)
+        event = Utils.fetch_schedule_item_by_id(event_id, company_id, 1)
         if not event:
             raise HTTPException(
                 status_code=500,
@@ -128,17 +164,20 @@ async def write_user_to_many_events(
             )
         events.append(event)
 
+    request.app.state.admission.admit(user.id, len(events))
+
     # Prepare parameters for check-in
     task_ids = []
     params = []
     for i in range(len(events)):
-        check_in = CheckIn(
+        check_in = CheckInRecord(
             id=str(uuid.uuid4()),
             event_id=events[i].id,
             user_id=user.id,
             status="pending",
-            created_at=datetime.now(timezone.utc).isoformat(),
-            updated_at=datetime.now(timezone.utc).isoformat(),
+            created=datetime.now(timezone.utc).isoformat(),
+            updated=datetime.now(timezone.utc).isoformat(),
+            company_id=company_id,
         )
         Utils.load_check_in(check_in)
         task_ids.append(check_in.id)
@@ -146,7 +185,8 @@ async def write_user_to_many_events(
 
     try:
         for param in params:
-            asyncio.create_task(request.app.state.scraper.user_check_in(*param))
+            task = request.app.state.scrapers[company_id].start_check_in(*param)
+            request.app.state.admission.track(user.id, task)
 
         event_ids = ", ".join(str(event.id) for event in events)
         task_urls = [
@@ -166,8 +206,18 @@ async def write_user_to_many_events(
         )
 
 
+@router.delete("/check-in/{id}", status_code=202)
+async def cancel_check_in(
+    id: Annotated[str, Path(title="The ID of the Check In to cancel")]
+) -> dict[str, str]:
+    if not Scraper.cancel_check_in(id):
+        raise HTTPException(status_code=404, detail=f"No running check in {id}")
+
+    return {"detail": f"Check in {id} cancelled", "id": id}
+
+
 @router.get("/check-in/status/{id}", response_model=CheckIn, status_code=200)
-async def get_check_in_status(
+def get_check_in_status(
     id: Annotated[str, Path(title="The ID of the Check In to get")]
 ) -> dict[str, str]:
     check_in = Utils.fetch_check_in(id)
@@ -176,8 +226,8 @@ async def get_check_in_status(
         raise HTTPException(status_code=204, detail=f"Task {id} not found")
 
     if check_in.status == "confirmed":
-        raise HTTPException(status_code=200, detail=check_in.model_dump())
-    elif check_in.status == "failed":
-        raise HTTPException(status_code=500, detail=check_in.model_dump())
+        raise HTTPException(status_code=200, detail=check_in.to_dict())
+    elif check_in.status in ("failed", "cancelled"):
+        raise HTTPException(status_code=500, detail=check_in.to_dict())
     else:
-        raise HTTPException(status_code=302, detail=check_in.model_dump())
+        raise HTTPException(status_code=302, detail=check_in.to_dict())
@@ -1,8 +1,9 @@
 import re
+from typing import Annotated
 
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request
 
-from dependencies import Utils
+from dependencies import Utils, get_company_id
 from models.users import ReadUser, User
 
 router = APIRouter(prefix="/users")
@@ -11,7 +12,11 @@ EMAIL_REGEX = r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$"
 
 
 @router.post("/", response_model=User, status_code=200)
-async def read_user(payload: ReadUser, request: Request) -> dict:
+async def read_user(
+    payload: ReadUser,
+    request: Request,
+    company_id: Annotated[int, Depends(get_company_id)],
+) -> dict:
     email = payload.email
     if not email:
         raise HTTPException(
@@ -24,9 +29,9 @@ async def read_user(payload: ReadUser, request: Request) -> dict:
             detail="Invalid email format.",
         )
 
-    user = Utils.fetch_user_by_email(email)
+    user = Utils.fetch_user_by_email(email, company_id)
     if not user:
-        data = request.app.state.scraper.fetch_punchpass_user_data(email)
+        data = request.app.state.scrapers[company_id].fetch_punchpass_user_data(email)
         if not data:
             raise HTTPException(
                 status_code=404,
@@ -1,16 +1,25 @@
+import asyncio
 import logging
 import os
 import re
+import threading
 import time
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from typing import Dict, Optional
+from typing import Coroutine, Dict, Optional
 
 import httpx
-from playwright.async_api import async_playwright
+from playwright.async_api import (
+    Browser,
+    BrowserContext,
+    Page,
+    Playwright,
+    async_playwright,
+)
 from selectolax.parser import HTMLParser
 
-from dependencies import Utils
-from models import CheckIn, Event, User
+from dependencies import DEFAULT_COMPANY_ID, Utils
+from models import CheckInRecord, EventRecord, User, UserRecord
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -19,25 +28,104 @@ logging.basicConfig(
 INSTRUCTOR_REGEX = re.compile(r"with\s+(.+?)(?:\s*⋅\s*(.+))?$")
 END_ELEM_REGEX = re.compile(r"(.+)\s@\s\d+:\d+-(\d+:\d+\s[ap]m)")
 START_ELEM_REGEX = re.compile(r"(.+)\s@\s(\d+:\d+)-\d+:\d+\s([ap]m)")
+BROWSER_SLOTS = int(os.environ.get("BROWSER_SLOTS", 4))
+
+# Upstream HTTP transport. httpx negotiates gzip and, with brotli installed, br.
+UPSTREAM_HTTP2 = os.environ.get("UPSTREAM_HTTP2", "1") == "1"
+UPSTREAM_LIMITS = httpx.Limits(
+    max_connections=int(os.environ.get("UPSTREAM_MAX_CONNECTIONS", 20)),
+    max_keepalive_connections=int(os.environ.get("UPSTREAM_MAX_KEEPALIVE", 10)),
+    keepalive_expiry=float(os.environ.get("UPSTREAM_KEEPALIVE_EXPIRY", 60)),
+)
+
+# Check-in deadlines, in seconds
+SLOT_TIMEOUT = float(os.environ.get("CHECK_IN_SLOT_TIMEOUT", 30))
+NAVIGATION_TIMEOUT = float(os.environ.get("CHECK_IN_NAVIGATION_TIMEOUT", 15))
+LOAD_TIMEOUT = float(os.environ.get("CHECK_IN_LOAD_TIMEOUT", 10))
+SEARCH_TIMEOUT = float(os.environ.get("CHECK_IN_SEARCH_TIMEOUT", 10))
+CHECK_IN_DEADLINE = float(os.environ.get("CHECK_IN_DEADLINE", 60))
+
+# Blocked inside the browser through CDP, so no request round-trips to Python.
+# This is a denylist: Network.setBlockedURLs in the Chromium bundled with
+# Playwright 1.42, and in the remote Scraping Browser, only takes wildcard block
+# patterns with no exceptions, so "every script but Punchpass's own" cannot be
+# expressed. A real allowlist needs Fetch.requestPaused or page.route, which send
+# every request back to Python. Scripts are therefore only blocked for the listed
+# third-party hosts; first-party Punchpass scripts, which drive the attendance
+# page's customer search, always load.
+BLOCKED_URL_PATTERNS = [
+    *(f"*.{ext}*" for ext in ("png", "jpg", "jpeg", "gif", "svg", "webp", "ico")),
+    *(f"*.{ext}*" for ext in ("woff", "woff2", "ttf", "otf", "eot")),
+    *(f"*.{ext}*" for ext in ("mp4", "webm", "mp3")),
+    "*.css*",
+    "*fonts.googleapis.com*",
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*connect.facebook.net*",
+    "*static.hotjar.com*",
+    "*widget.intercom.io*",
+    "*js.intercomcdn.com*",
+]
+
+
+@dataclass
+class TransferStats:
+    """Upstream request and byte counters, safe to update from ETL threads."""
+
+    requests: int = 0
+    bytes_downloaded: int = 0
+    bytes_decoded: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, response: httpx.Response, decoded: int) -> None:
+        with self._lock:
+            self.requests += 1
+            self.bytes_downloaded += response.num_bytes_downloaded
+            self.bytes_decoded += decoded
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests = self.bytes_downloaded = self.bytes_decoded = 0
 
 
 class Scraper:
-    _instance: Optional["Scraper"] = None
-    cookies_store: Dict[str, str] = {}
-
-    def __new__(cls) -> "Scraper":
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            logging.info("Scraper instance created")
-        return cls._instance
-
-    def __init__(self) -> None:
-        if not hasattr(self, "session"):
-            self.client = httpx.Client()
+    """
+    Punchpass client scoped to a single company (studio).
+
+    One instance exists per company, each with its own session and cookies.
+    All companies share one long-lived browser, in which each company keeps a
+    single authenticated context, so pages reuse its HTTP cache. Cold-browser
+    check-ins across all companies share `BROWSER_SLOTS`.
+    """
+
+    _instances: Dict[int, "Scraper"] = {}
+    _playwright: Optional[Playwright] = None
+    _browser: Optional[Browser] = None
+    _browser_lock = asyncio.Lock()
+    browser_slots = asyncio.Semaphore(BROWSER_SLOTS)
+    slots_in_use = 0
+    jobs: Dict[str, asyncio.Task] = {}
+    background: set[asyncio.Task] = set()
+
+    def __new__(cls, company_id: int = DEFAULT_COMPANY_ID) -> "Scraper":
+        if company_id not in cls._instances:
+            cls._instances[company_id] = super().__new__(cls)
+            logging.info(f"Scraper instance created for company {company_id}")
+        return cls._instances[company_id]
+
+    def __init__(self, company_id: int = DEFAULT_COMPANY_ID) -> None:
+        if not hasattr(self, "client"):
+            self.company_id = company_id
+            self.cookies_store: Dict[str, str] = {}
+            self.client = httpx.Client(http2=UPSTREAM_HTTP2, limits=UPSTREAM_LIMITS)
+            self.stats = TransferStats()
             self.headers = {
                 "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
             }
             self.baseurl = "https://app.punchpass.com"
+            self.warmer = None
+            self._context: Optional[BrowserContext] = None
+            self._context_lock = asyncio.Lock()
             self._login()
 
     def _get_auth_token(self) -> str:
@@ -63,15 +151,15 @@ class Scraper:
         Loads cookies from the in-memory store.
         """
         logging.info("Loading cookies.")
-        if Scraper.cookies_store:
+        if self.cookies_store:
             try:
-                self.session.cookies.update(self.cookies_store)
+                self.client.cookies.update(self.cookies_store)
                 logging.info("Loaded cookies from in-memory store")
             except Exception as e:
                 logging.error(f"Failed to load cookies: {e}")
 
     def _login(self) -> None:
-        if not Scraper.cookies_store:
+        if not self.cookies_store:
             auth_token = self._get_auth_token()
             email = os.environ.get("EMAIL")
             password = os.environ.get("PASSWORD")
@@ -82,9 +170,10 @@ class Scraper:
                 "account[password]": password,
             }
 
-            self.client.post(f"{self.baseurl}/account/sign_in", data=payload)
+            response = self.client.post(f"{self.baseurl}/account/sign_in", data=payload)
+            self.stats.record(response, len(response.content))
             self.get_page(
-                f"{self.baseurl}/account/companies/12433/switch_to_admin_view"
+                f"{self.baseurl}/account/companies/{self.company_id}/switch_to_admin_view"
             )
 
             self.cookies_store = {
@@ -94,17 +183,51 @@ class Scraper:
                 ),
                 "_punchpass52_session": self.client.cookies.get("_punchpass52_session"),
             }
-            logging.info("Saved cookies to in-memory store")
+            logging.info(
+                f"Saved cookies for company {self.company_id} to in-memory store"
+            )
 
     def get_page(self, url: str) -> Optional[httpx.Response]:
         try:
             response = self.client.get(url, headers=self.headers)
+            self.stats.record(response, len(response.content))
             return response
         except Exception as e:
             logging.error(f"Failed to fetch page: {url}. Error: {e}")
             return None
 
-    def parse_schedule_item(self, elem: HTMLParser) -> Event:
+    def get_page_until(self, url: str, marker: str) -> Optional[str]:
+        """
+        Fetches a page, over HTTP/2 only until `marker` appears in its body.
+
+        Over HTTP/2 the rest of the response is never downloaded; the stream is
+        reset without dropping the connection. httpx does not return a half-read
+        HTTP/1.1 connection to the pool, so over HTTP/1.1 the whole body is read
+        to keep the connection alive.
+        """
+        try:
+            with self.client.stream("GET", url, headers=self.headers) as response:
+                if response.status_code != 200:
+                    response.read()
+                    self.stats.record(response, len(response.content))
+                    logging.error(
+                        f"Failed to fetch page: {url}. Status: {response.status_code}"
+                    )
+                    return None
+
+                partial = response.http_version == "HTTP/2"
+                body = ""
+                for chunk in response.iter_text():
+                    body += chunk
+                    if partial and marker in body:
+                        break
+                self.stats.record(response, len(body.encode()))
+                return body
+        except Exception as e:
+            logging.error(f"Failed to fetch page: {url}. Error: {e}")
+            return None
+
+    def parse_schedule_item(self, elem: HTMLParser) -> EventRecord:
         url = f"{self.baseurl}{elem.css_first('div.cell.auto.small-order-2.medium-auto.medium-order-2 strong a.with-icon').attrs['href']}"
         id = url.split("/")[-1]
 
@@ -136,10 +259,11 @@ class Scraper:
         match = INSTRUCTOR_REGEX.search(instructor_elem)
         instructor = match.group(1)
         location = match.group(2) if match.group(2) else ""
-        start = self._get_start_time(url)
-        end = self._get_end_time(url)
+        heading = self._get_schedule_heading(url)
+        start = self._get_start_time(heading) if heading else None
+        end = self._get_end_time(heading) if heading else None
 
-        event = Event(
+        event = EventRecord(
             id=int(id),
             status=status,
             url=url,
@@ -150,42 +274,44 @@ class Scraper:
             instructor=instructor,
             start=start,
             end=end,
+            company_id=self.company_id,
         )
         return event
 
-    def _get_end_time(self, url: str) -> Optional[Dict[str, str]]:
-        response = self.get_page(url)
-        if response and response.status_code == 200:
-            html = HTMLParser(response.text)
-            end_elem = html.css_first("div.cell.auto h1 small").text().strip()
-            end_elem_str = END_ELEM_REGEX.sub(r"\1 \2", end_elem)
-            try:
-                dt = datetime.strptime(end_elem_str, "%B %d, %Y %I:%M %p")
-                end = Utils.format_time(dt)
-                return end
-            except ValueError:
-                logging.error("Failed to parse end time.")
+    def _get_schedule_heading(self, url: str) -> Optional[str]:
+        """Fetches an event's detail page up to its heading and returns the date and time line."""
+        body = self.get_page_until(url, "</h1>")
+        if body:
+            heading = HTMLParser(body).css_first("div.cell.auto h1 small")
+            if heading:
+                return heading.text().strip()
         return None
 
-    def _get_start_time(self, url: str) -> Optional[Dict[str, str]]:
-        response = self.get_page(url)
-        if response and response.status_code == 200:
-            html = HTMLParser(response.text)
-            start_elem = html.css_first("div.cell.auto h1 small").text().strip()
-            start_elem_str = START_ELEM_REGEX.sub(r"\1 \2 \3", start_elem)
-            try:
-                dt = datetime.strptime(start_elem_str, "%B %d, %Y %I:%M %p")
-                start = Utils.format_time(dt)
-                return start
-            except ValueError:
-                logging.error("Failed to parse end time.")
-            return None
+    def _get_end_time(self, heading: str) -> Optional[str]:
+        end_elem_str = END_ELEM_REGEX.sub(r"\1 \2", heading)
+        try:
+            dt = datetime.strptime(end_elem_str, "%B %d, %Y %I:%M %p")
+            end = Utils.format_time(dt)
+            return end
+        except ValueError:
+            logging.error("Failed to parse end time.")
+        return None
+
+    def _get_start_time(self, heading: str) -> Optional[str]:
+        start_elem_str = START_ELEM_REGEX.sub(r"\1 \2 \3", heading)
+        try:
+            dt = datetime.strptime(start_elem_str, "%B %d, %Y %I:%M %p")
+            start = Utils.format_time(dt)
+            return start
+        except ValueError:
+            logging.error("Failed to parse start time.")
+        return None
 
     def fetch_punchpass_user_data(self, email: str) -> User | None:
         url = f"https://app.punchpass.com/a/customers.json?columns[3][data]=email&columns[3][searchable]=true&columns[3][orderable]=true&columns[3][search][value]={email}&start=0&length=1"
         try:
             response = self.get_page(url)
-            data = Utils.parse_user_data(response.json())
+            data = Utils.parse_user_data(response.json(), self.company_id)
             if not data:
                 return None
         except Exception as e:
@@ -193,94 +319,230 @@ class Scraper:
         finally:
             return data
 
-    async def user_check_in(self, user: User, event: Event, check_in: CheckIn) -> None:
+    @classmethod
+    async def get_browser(cls) -> Browser:
         """
-        Performs the check-in process for a user at an event.
+        Returns the shared browser, launching it (or reconnecting) when needed.
 
-        Args:
-          user (User): The user object representing the user checking in.
-          event (Event): The event object representing the event where the check-in is performed.
-          check_in (CheckIn): The check-in object to be updated with the check-in status.
-
-        Returns:
-          None
+        Debug mode launches a local Chromium; otherwise it connects to the Scraping Browser.
         """
-        start = time.perf_counter()
-        browser = None
-        name = f"{user.first_name} {user.last_name}"
-        async with async_playwright() as p:
-            if __debug__:
-                browser = await p.chromium.launch(
-                    args=[
-                        "--no-sanbox",
-                        "--disable-setuid-sandbox",
-                        "--disable-gl-drawing-for-tests",
-                    ],
-                )
-            else:
-                browser = await p.chromium.connect_over_cdp(
-                    os.environ.get("SBR_WS_CDP")
-                )
-
-            try:
+        async with cls._browser_lock:
+            if cls._browser is None or not cls._browser.is_connected():
+                if cls._playwright is None:
+                    cls._playwright = await async_playwright().start()
                 if __debug__:
-                    logging.info(f"Launching browser. Navigating to {event.url}...")
+                    logging.info("Launching shared browser")
+                    cls._browser = await cls._playwright.chromium.launch(
+                        args=[
+                            "--no-sanbox",
+                            "--disable-setuid-sandbox",
+                            "--disable-gl-drawing-for-tests",
+                            "--blink-settings=imagesEnabled=false",
+                        ],
+                    )
                 else:
-                    logging.info(
-                        f"Connected to Scraping Browser. Navigating to {event.url}..."
+                    logging.info("Connecting to Scraping Browser")
+                    cls._browser = await cls._playwright.chromium.connect_over_cdp(
+                        os.environ.get("SBR_WS_CDP")
                     )
+            return cls._browser
+
+    @classmethod
+    async def close_browser(cls) -> None:
+        if cls._browser:
+            await cls._browser.close()
+            cls._browser = None
+        if cls._playwright:
+            await cls._playwright.stop()
+            cls._playwright = None
+        for scraper in cls._instances.values():
+            scraper._context = None
+
+    async def _get_context(self) -> BrowserContext:
+        """
+        Returns this company's authenticated context in the shared browser.
 
+        Created under a per-company lock so concurrent first check-ins share one
+        context instead of each creating their own.
+        """
+        browser = await Scraper.get_browser()
+        async with self._context_lock:
+            if self._context is None or self._context.browser is not browser:
                 context = await browser.new_context()
                 await context.add_cookies(
                     Utils.format_cookies(self.cookies_store, self.baseurl)
                 )
-                page = await context.new_page()
-                client = await page.context.new_cdp_session(page)
+                self._context = context
+            return self._context
 
-                await client.send(
-                    "Network.setCacheDisabled", {"cacheDisabled": False}
-                )  # Force enable cache
-
-                if not __debug__:
-                    logging.info("PRODUCTION MODE")
-                    await client.send(
-                        "Proxy.setLocation",
-                        {"lat": 30.2712, "lon": -97.7417, "distance": 50},
-                    )  # Set location to Austin, TX
-                    await client.send(
-                        "Captcha.setAutoSolve", {"autoSolve": False}
-                    )  # Disable auto-solving captchas
-
-                await page.route(
-                    "**/*",
-                    lambda route: (
-                        route.abort()
-                        if route.request.resource_type
-                        in ["image", "media", "font", "stylesheet"]
-                        else route.continue_()
-                    ),
-                )
+    async def new_page(self) -> Page:
+        """
+        Opens an authenticated page that skips images, media, fonts and stylesheets.
 
-                await page.goto(f"{event.url}/attendances/new")
-                customer_list = page.get_by_title("{{2*2}} lkslsk")
-                await customer_list.wait_for(state="attached")
-                input = page.get_by_placeholder("Search")
-                await input.type(name)
-                user_btn = page.get_by_title(name, exact=True)
-                await user_btn.wait_for(state="attached")
+        If any setup step fails or is cancelled, the page is closed before the
+        error propagates, so it does not linger in the long-lived context.
+        """
+        context = await self._get_context()
+        page = await context.new_page()
+        try:
+            client = await page.context.new_cdp_session(page)
 
-                if not __debug__:
-                    await user_btn.click()
+            await client.send("Network.enable")
+            await client.send(
+                "Network.setCacheDisabled", {"cacheDisabled": False}
+            )  # Force enable cache
+            await client.send("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
 
-            except Exception as e:
-                check_in.status = "failed"
-                check_in.updated = datetime.now(timezone.utc).isoformat()
-                Utils.load_check_in(check_in)
-                logging.error(f"Error checking in {name}: {e}")
+            if not __debug__:
+                logging.info("PRODUCTION MODE")
+                await client.send(
+                    "Proxy.setLocation",
+                    {"lat": 30.2712, "lon": -97.7417, "distance": 50},
+                )  # Set location to Austin, TX
+                await client.send(
+                    "Captcha.setAutoSolve", {"autoSolve": False}
+                )  # Disable auto-solving captchas
+        except BaseException:
+            Scraper.run_in_background(page.close(), "Closing page after failed setup")
+            raise
+
+        return page
+
+    async def open_attendance(self, page: Page, url: str) -> None:
+        """Navigates to an event's attendance page and waits for the customer list."""
+        await page.goto(f"{url}/attendances/new", timeout=NAVIGATION_TIMEOUT * 1000)
+        customer_list = page.get_by_title("{{2*2}} lkslsk")
+        await customer_list.wait_for(state="attached", timeout=LOAD_TIMEOUT * 1000)
+
+    async def select_customer(self, page: Page, name: str) -> None:
+        """Searches the attendance page for a customer and checks them in."""
+        input = page.get_by_placeholder("Search")
+        await input.type(name, timeout=SEARCH_TIMEOUT * 1000)
+        user_btn = page.get_by_title(name, exact=True)
+        await user_btn.wait_for(state="attached", timeout=SEARCH_TIMEOUT * 1000)
+
+        if not __debug__:
+            await user_btn.click(timeout=SEARCH_TIMEOUT * 1000)
+
+    async def clear_search(self, page: Page) -> None:
+        """Empties the attendance page's customer search so the page can be reused."""
+        await page.get_by_placeholder("Search").fill("", timeout=SEARCH_TIMEOUT * 1000)
+
+    async def _check_in(
+        self, event: EventRecord, name: str, started: list[float]
+    ) -> None:
+        """
+        Checks a customer in on the event's warm page, or on a new page once a browser slot is free.
+
+        Appends the time the job got its page or slot to `started`.
+        """
+        page = self.warmer.acquire(event.id) if self.warmer else None
+        if page is not None:
+            logging.info(f"Using warm attendance page for event {event.id}")
+            started.append(time.perf_counter())
+            healthy = False
+            try:
+                await self.select_customer(page, name)
+                healthy = True
             finally:
-                await browser.close()
-                check_in.status = "confirmed"
-                check_in.updated = datetime.now(timezone.utc).isoformat()
-                Utils.load_check_in(check_in)
-                runtime = "{:.4f}".format(time.perf_counter() - start)
-                logging.info(f"Request completed in {runtime} s")
+                self.warmer.release(event.id, healthy)
+            return
+
+        await asyncio.wait_for(Scraper.browser_slots.acquire(), SLOT_TIMEOUT)
+        Scraper.slots_in_use += 1
+        started.append(time.perf_counter())
+        try:
+            logging.info(f"Opening page. Navigating to {event.url}...")
+            page = await self.new_page()
+            await self.open_attendance(page, event.url)
+            await self.select_customer(page, name)
+        finally:
+            Scraper.slots_in_use -= 1
+            Scraper.browser_slots.release()
+            if page is not None:
+                # Closed in the background so a cancelled job frees its slot at once.
+                Scraper.run_in_background(page.close(), "Closing check-in page")
+
+    async def user_check_in(
+        self, user: UserRecord, event: EventRecord, check_in: CheckInRecord
+    ) -> Optional[float]:
+        """
+        Performs the check-in process for a user at an event.
+
+        Uses the event's warm attendance page when the warmer has one free,
+        otherwise waits for a browser slot, opens a page and navigates to the attendance page.
+        Each phase has its own timeout and the whole job must finish within
+        `CHECK_IN_DEADLINE`. The check-in ends as `confirmed`, `failed` or,
+        if the job is cancelled, `cancelled`.
+
+        Args:
+          user (UserRecord): The user object representing the user checking in.
+          event (EventRecord): The event object representing the event where the check-in is performed.
+          check_in (CheckInRecord): The check-in object to be updated with the check-in status.
+
+        Returns:
+          float | None: Seconds spent after the job got its page or browser slot,
+          or None if it never got one.
+        """
+        start = time.perf_counter()
+        started: list[float] = []
+        name = f"{user.first_name} {user.last_name}"
+        try:
+            await asyncio.wait_for(
+                self._check_in(event, name, started), CHECK_IN_DEADLINE
+            )
+            check_in.status = "confirmed"
+        except asyncio.TimeoutError:
+            check_in.status = "failed"
+            logging.error(f"Error checking in {name}: timed out")
+        except asyncio.CancelledError:
+            check_in.status = "cancelled"
+            logging.info(f"Check in {check_in.id} for {name} cancelled")
+            raise
+        except Exception as e:
+            check_in.status = "failed"
+            logging.error(f"Error checking in {name}: {e}")
+        finally:
+            check_in.updated = datetime.now(timezone.utc).isoformat()
+            Utils.load_check_in(check_in)
+            runtime = "{:.4f}".format(time.perf_counter() - start)
+            logging.info(f"Request completed in {runtime} s")
+
+        return time.perf_counter() - started[0] if started else None
+
+    def start_check_in(
+        self, user: UserRecord, event: EventRecord, check_in: CheckInRecord
+    ) -> asyncio.Task:
+        """Schedules `user_check_in` as a background job that can be cancelled by check-in ID."""
+        task = asyncio.create_task(self.user_check_in(user, event, check_in))
+        Scraper.jobs[check_in.id] = task
+        task.add_done_callback(lambda _: Scraper.jobs.pop(check_in.id, None))
+        return task
+
+    @classmethod
+    def run_in_background(cls, coro: Coroutine, description: str) -> asyncio.Task:
+        """
+        Schedules a fire-and-forget coroutine.
+
+        The task is kept in `background` until it finishes, so it cannot be
+        garbage collected mid-flight, and a failure is logged with `description`.
+        """
+        task = asyncio.create_task(coro)
+        cls.background.add(task)
+
+        def done(task: asyncio.Task) -> None:
+            cls.background.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                logging.error(f"{description} failed: {task.exception()}")
+
+        task.add_done_callback(done)
+        return task
+
+    @classmethod
+    def cancel_check_in(cls, id: str) -> bool:
+        """Cancels a running check-in job. Returns False if no job with that ID is running."""
+        task = cls.jobs.get(id)
+        if task is None:
+            return False
+        task.cancel()
+        return True
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from playwright.async_api import Page
+
+from dependencies import Utils
+from scraper import Scraper
+
+WARM_LEAD = timedelta(minutes=int(os.environ.get("WARM_LEAD_MINUTES", 15)))
+WARM_REFRESH = timedelta(minutes=int(os.environ.get("WARM_REFRESH_MINUTES", 10)))
+WARM_INTERVAL = int(os.environ.get("WARM_INTERVAL_SECONDS", 30))
+WARM_MAX_PAGES = int(os.environ.get("WARM_MAX_PAGES", 4))
+
+
+@dataclass
+class WarmPage:
+    company_id: int
+    page: Page
+    url: str
+    primed: datetime
+    ready: bool = False
+    busy: bool = False
+    priming: bool = False
+
+
+class PageWarmer:
+    """
+    Keeps one authenticated attendance page open per upcoming event.
+
+    Pages live in the scrapers' shared browser, each opened through its
+    company's scraper. Every `WARM_INTERVAL` seconds the warmer opens pages for today's events
+    starting within `WARM_LEAD`, re-primes pages older than `WARM_REFRESH`,
+    and closes pages for events that have ended. At most `WARM_MAX_PAGES` pages
+    are open at once, for the soonest events; warm pages do not take one of
+    `BROWSER_SLOTS`.
+
+    After a check-in the search box is cleared and the page stays ready, so
+    later check-ins for the same class reuse it without navigating again.
+    """
+
+    def __init__(self, scrapers: dict) -> None:
+        self.scrapers = scrapers
+        self.pages: dict[int, WarmPage] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+        logging.info("Page warmer started")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+        for event_id in list(self.pages):
+            await self._close(event_id)
+        logging.info("Page warmer stopped")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logging.error(f"Error warming attendance pages: {e}")
+            await asyncio.sleep(WARM_INTERVAL)
+
+    async def sync(self) -> None:
+        """Opens, refreshes and closes warm pages to match today's upcoming events."""
+        now = datetime.now(timezone.utc)
+        upcoming = {}
+        for company_id in self.scrapers:
+            for event in Utils.fetch_events_for_today(company_id) or []:
+                if (
+                    event["status"] != "confirmed"
+                    or not event["start"]
+                    or not event["end"]
+                ):
+                    continue
+                start = datetime.fromisoformat(event["start"])
+                end = datetime.fromisoformat(event["end"])
+                if start - WARM_LEAD <= now < end:
+                    upcoming[event["id"]] = (start, company_id, event["url"])
+
+        for event_id in list(self.pages):
+            warm = self.pages[event_id]
+            if event_id not in upcoming and not warm.busy and not warm.priming:
+                await self._close(event_id)
+
+        soonest = sorted(upcoming.items(), key=lambda item: item[1][0])
+        for event_id, (_, company_id, url) in soonest:
+            warm = self.pages.get(event_id)
+            if warm is None:
+                if len(self.pages) >= WARM_MAX_PAGES:
+                    continue
+                page = await self.scrapers[company_id].new_page()
+                warm = WarmPage(company_id=company_id, page=page, url=url, primed=now)
+                self.pages[event_id] = warm
+                await self._prime(event_id, warm)
+            elif warm.busy or warm.priming:
+                continue
+            elif not warm.ready or now - warm.primed > WARM_REFRESH:
+                await self._prime(event_id, warm)
+
+    async def _prime(self, event_id: int, warm: WarmPage) -> None:
+        warm.ready = False
+        warm.priming = True
+        try:
+            await self.scrapers[warm.company_id].open_attendance(warm.page, warm.url)
+            warm.primed = datetime.now(timezone.utc)
+            warm.ready = True
+            logging.info(f"Attendance page for event {event_id} is warm")
+        except Exception as e:
+            logging.error(f"Failed to warm attendance page for event {event_id}: {e}")
+        finally:
+            warm.priming = False
+
+    async def _reset(self, event_id: int, warm: WarmPage) -> None:
+        try:
+            await self.scrapers[warm.company_id].clear_search(warm.page)
+        except Exception as e:
+            logging.error(f"Failed to reset attendance page for event {event_id}: {e}")
+            await self._prime(event_id, warm)
+        finally:
+            warm.busy = False
+
+    async def _close(self, event_id: int) -> None:
+        warm = self.pages.pop(event_id)
+        await warm.page.close()
+        logging.info(f"Closed attendance page for event {event_id}")
+
+    def acquire(self, event_id: int) -> Page | None:
+        """Returns the event's warm page and marks it busy, or None if none is free."""
+        warm = self.pages.get(event_id)
+        if warm is None or not warm.ready or warm.busy:
+            return None
+        warm.busy = True
+        return warm.page
+
+    def release(self, event_id: int, healthy: bool = False) -> None:
+        """
+        Frees a page taken with `acquire`.
+
+        After a successful check-in the page's search box is cleared in the
+        background and the page stays ready; after a failure it is re-primed.
+        """
+        warm = self.pages.get(event_id)
+        if warm is None:
+            return
+        if healthy:
+            Scraper.run_in_background(
+                self._reset(event_id, warm), f"Resetting page for event {event_id}"
+            )
+            return
+
+        warm.busy = False
+        warm.ready = False
+        warm.priming = True
+        Scraper.run_in_background(
+            self._prime(event_id, warm), f"Re-priming page for event {event_id}"
+        )